@@ -111,9 +111,8 @@ class DataModel(ABC):
             Returns the nominal value of the parameter that is understood
             by Magma code.
         """
-        transforms = cls._get_magma_transforms()
-        if param_name in transforms:
-            transform_function = transforms[param_name]
+        transform_function = cls._get_magma_transforms().get(param_name)
+        if transform_function is not None:
             return transform_function(enb_value)
         return enb_value
 
@@ -139,9 +138,8 @@ class DataModel(ABC):
             Returns the native value of the parameter that will be set in the
             CPE data model configuration.
         """
-        transforms = cls._get_enb_transforms()
-        if param_name in transforms:
-            transform_function = transforms[param_name]
+        transform_function = cls._get_enb_transforms().get(param_name)
+        if transform_function is not None:
             return transform_function(magma_value)
         return magma_value
 
@@ -8,6 +8,8 @@ of patent rights can be found in the PATENTS file in the same directory.
 """
 
 import logging
+import sys
+from types import MappingProxyType
 from typing import Optional, Callable, Dict, Any, List, Type
 from magma.enodebd.data_models.data_model import TrParam, DataModel
 from magma.enodebd.data_models.data_model_parameters import TrParameterType, \
@@ -31,64 +33,9 @@ from magma.enodebd.state_machines.enb_acs_states import DisconnectedState, \
     AcsReadMsgResult, UnexpectedInformState, ErrorState
 from magma.enodebd.tr069 import models
 
-
-class CaviumHandler(BasicEnodebAcsStateMachine):
-    def reboot_asap(self) -> None:
-        self.transition('reboot')
-
-    def is_enodeb_connected(self) -> bool:
-        return not isinstance(self.state, DisconnectedState)
-
-    def _init_state_map(self) -> None:
-        self._state_map = {
-            'disconnected': DisconnectedState(self, when_done='get_transient_params'),
-            'get_transient_params': SendGetTransientParametersState(self, when_done='wait_get_transient_params'),
-            'wait_get_transient_params': WaitGetTransientParametersState(self, when_get='get_params', when_get_obj_params='get_obj_params', when_delete='delete_objs', when_add='add_objs', when_set='set_params', when_skip='get_transient_params'),
-            'get_params': GetParametersState(self, when_done='wait_get_parameters'),
-            'wait_get_params': WaitGetParametersState(self, when_done='disable_admin'),
-            'disable_admin': CaviumDisableAdminEnableState(self, when_done='wait_disable_admin'),
-            'wait_disable_admin': CaviumWaitDisableAdminEnableState(self, when_done='delete_objs'),
-            'delete_objs': DeleteObjectsState(self, when_add='add_objs', when_skip='set_params'),
-            'add_objs': AddObjectsState(self, when_done='set_params'),
-            'set_params': SetParameterValuesNotAdminState(self, when_done='wait_set_params'),
-            'wait_set_params': WaitSetParameterValuesState(self, when_done='get_transient_params'),
-            # Below states only entered through manual user intervention
-            'reboot': SendRebootState(self, when_done='wait_reboot'),
-            'wait_reboot': WaitRebootResponseState(self, when_done='wait_post_reboot_inform'),
-            'wait_post_reboot_inform': WaitInformMRebootState(self, when_done='wait_reboot_delay', when_timeout='disconnected'),
-            # The states below are entered when an unexpected message type is
-            # received
-            'unexpected_inform': UnexpectedInformState(self, when_done='wait_empty'),
-            'unexpected_fault': ErrorState(self)
-        }
-
-    @property
-    def device_name(self) -> str:
-        return EnodebDeviceName.CAVIUM
-
-    @property
-    def data_model_class(self) -> Type[DataModel]:
-        return CaviumTrDataModel
-
-    @property
-    def config_postprocessor(self) -> EnodebConfigurationPostProcessor:
-        return CaviumTrConfigurationInitializer()
-
-    @property
-    def state_map(self) -> Dict[str, EnodebAcsState]:
-        return self._state_map
-
-    @property
-    def disconnected_state_name(self) -> str:
-        return 'disconnected'
-
-    @property
-    def unexpected_inform_state_name(self) -> str:
-        return 'unexpected_inform'
-
-    @property
-    def unexpected_fault_state_name(self) -> str:
-        return 'unexpected_fault'
+# Top-level objects, which are not reported as regular parameter names
+_EXCLUDED_PARAM_NAMES = frozenset((ParameterName.DEVICE,
+                                   ParameterName.FAP_SERVICE))
 
 
 class CaviumDisableAdminEnableState(EnodebAcsState):
@@ -96,6 +43,10 @@ class CaviumDisableAdminEnableState(EnodebAcsState):
     Cavium requires that we disable 'Admin Enable' before configuring
     most parameters
     """
+    # Only the single 'Admin Enable' parameter is ever set by this state
+    ARRAY_TYPE = 'cwmp:ParameterValueStruct[1]'
+    VALUE_TYPE = 'xsd:string'
+
     def __init__(self, acs: EnodebAcsStateMachine, when_done: str):
         super().__init__()
         self.acs = acs
@@ -114,17 +65,15 @@ class CaviumDisableAdminEnableState(EnodebAcsState):
         param_name = ParameterName.ADMIN_STATE
         admin_path = self.acs.data_model.get_parameter(param_name).path
         admin_value = self.acs.data_model.transform_for_enb(param_name, False)
-        param_values = {admin_path: admin_value}
 
         request = models.SetParameterValues()
         request.ParameterList = models.ParameterValueList()
-        request.ParameterList.arrayType = 'cwmp:ParameterValueStruct[%d]' \
-                                          % len(param_values)
+        request.ParameterList.arrayType = self.ARRAY_TYPE
 
         name_value = models.ParameterValueStruct()
         name_value.Name = admin_path
         name_value.Value = models.anySimpleType()
-        name_value.Value.type = 'xsd:string'
+        name_value.Value.type = self.VALUE_TYPE
         name_value.Value.Data = str(admin_value)
         request.ParameterList.ParameterValueStruct = [name_value]
 
@@ -142,7 +91,12 @@ class CaviumWaitDisableAdminEnableState(EnodebAcsState):
         self.done_transition = when_done
 
     def read_msg(self, message: Any) -> Optional[str]:
-        if type(message) == models.Fault:
+        if isinstance(message, models.SetParameterValuesResponse):
+            if message.Status != 0:
+                raise Tr069Error('Received SetParameterValuesResponse with '
+                                 'Status=%d' % message.Status)
+            return AcsReadMsgResult(True, self.done_transition)
+        if isinstance(message, models.Fault):
             logging.error('Received Fault in response to SetParameterValues')
             if message.SetParameterValuesFault is not None:
                 for fault in message.SetParameterValuesFault:
@@ -152,18 +106,78 @@ class CaviumWaitDisableAdminEnableState(EnodebAcsState):
             raise Tr069Error(
                 'Received Fault in response to SetParameterValues '
                 '(faultstring = %s)' % message.FaultString)
-        elif not isinstance(message, models.SetParameterValuesResponse):
-            return AcsReadMsgResult(False, None)
-        if message.Status != 0:
-            raise Tr069Error('Received SetParameterValuesResponse with '
-                             'Status=%d' % message.Status)
-        return AcsReadMsgResult(True, self.done_transition)
+        return AcsReadMsgResult(False, None)
 
     @classmethod
     def state_description(cls) -> str:
         return 'Disabling admin_enable (Cavium only)'
 
 
+class CaviumHandler(BasicEnodebAcsStateMachine):
+    def reboot_asap(self) -> None:
+        self.transition('reboot')
+
+    def is_enodeb_connected(self) -> bool:
+        return not isinstance(self.state, DisconnectedState)
+
+    # (state name, state class, transition kwargs)
+    _STATE_SPEC = (
+        ('disconnected', DisconnectedState, {'when_done': 'get_transient_params'}),
+        ('get_transient_params', SendGetTransientParametersState, {'when_done': 'wait_get_transient_params'}),
+        ('wait_get_transient_params', WaitGetTransientParametersState, {'when_get': 'get_params', 'when_get_obj_params': 'get_obj_params', 'when_delete': 'delete_objs', 'when_add': 'add_objs', 'when_set': 'set_params', 'when_skip': 'get_transient_params'}),
+        ('get_params', GetParametersState, {'when_done': 'wait_get_parameters'}),
+        ('wait_get_params', WaitGetParametersState, {'when_done': 'disable_admin'}),
+        ('disable_admin', CaviumDisableAdminEnableState, {'when_done': 'wait_disable_admin'}),
+        ('wait_disable_admin', CaviumWaitDisableAdminEnableState, {'when_done': 'delete_objs'}),
+        ('delete_objs', DeleteObjectsState, {'when_add': 'add_objs', 'when_skip': 'set_params'}),
+        ('add_objs', AddObjectsState, {'when_done': 'set_params'}),
+        ('set_params', SetParameterValuesNotAdminState, {'when_done': 'wait_set_params'}),
+        ('wait_set_params', WaitSetParameterValuesState, {'when_done': 'get_transient_params'}),
+        # Below states only entered through manual user intervention
+        ('reboot', SendRebootState, {'when_done': 'wait_reboot'}),
+        ('wait_reboot', WaitRebootResponseState, {'when_done': 'wait_post_reboot_inform'}),
+        ('wait_post_reboot_inform', WaitInformMRebootState, {'when_done': 'wait_reboot_delay', 'when_timeout': 'disconnected'}),
+        # The states below are entered when an unexpected message type is
+        # received
+        ('unexpected_inform', UnexpectedInformState, {'when_done': 'wait_empty'}),
+        ('unexpected_fault', ErrorState, {}),
+    )
+
+    def _init_state_map(self) -> None:
+        self._state_map = {
+            name: state_cls(self, **kwargs)
+            for name, state_cls, kwargs in self._STATE_SPEC
+        }
+
+    @property
+    def device_name(self) -> str:
+        return EnodebDeviceName.CAVIUM
+
+    @property
+    def data_model_class(self) -> Type[DataModel]:
+        return CaviumTrDataModel
+
+    @property
+    def config_postprocessor(self) -> EnodebConfigurationPostProcessor:
+        return _CONFIG_POSTPROCESSOR
+
+    @property
+    def state_map(self) -> Dict[str, EnodebAcsState]:
+        return self._state_map
+
+    @property
+    def disconnected_state_name(self) -> str:
+        return 'disconnected'
+
+    @property
+    def unexpected_inform_state_name(self) -> str:
+        return 'unexpected_inform'
+
+    @property
+    def unexpected_fault_state_name(self) -> str:
+        return 'unexpected_fault'
+
+
 class CaviumTrDataModel(DataModel):
     """
     Class to represent relevant data model parameters from TR-196/TR-098/TR-181.
@@ -234,17 +248,39 @@ class CaviumTrDataModel(DataModel):
 
     NUM_PLMNS_IN_CONFIG = 6
     for i in range(1, NUM_PLMNS_IN_CONFIG + 1):
+        PLMN_PATH = FAPSERVICE_PATH + 'CellConfig.LTE.EPC.PLMNList.%d.' % i
         PARAMETERS[ParameterName.PLMN_N % i] = TrParam(
-            FAPSERVICE_PATH + 'CellConfig.LTE.EPC.PLMNList.%d.' % i, True, TrParameterType.OBJECT, False)
+            PLMN_PATH, True, TrParameterType.OBJECT, False)
         PARAMETERS[ParameterName.PLMN_N_CELL_RESERVED % i] = TrParam(
-            FAPSERVICE_PATH
-            + 'CellConfig.LTE.EPC.PLMNList.%d.CellReservedForOperatorUse' % i, True, TrParameterType.BOOLEAN, False)
+            PLMN_PATH + 'CellReservedForOperatorUse', True, TrParameterType.BOOLEAN, False)
         PARAMETERS[ParameterName.PLMN_N_ENABLE % i] = TrParam(
-            FAPSERVICE_PATH + 'CellConfig.LTE.EPC.PLMNList.%d.Enable' % i, True, TrParameterType.BOOLEAN, False)
+            PLMN_PATH + 'Enable', True, TrParameterType.BOOLEAN, False)
         PARAMETERS[ParameterName.PLMN_N_PRIMARY % i] = TrParam(
-            FAPSERVICE_PATH + 'CellConfig.LTE.EPC.PLMNList.%d.IsPrimary' % i, True, TrParameterType.BOOLEAN, False)
+            PLMN_PATH + 'IsPrimary', True, TrParameterType.BOOLEAN, False)
         PARAMETERS[ParameterName.PLMN_N_PLMNID % i] = TrParam(
-            FAPSERVICE_PATH + 'CellConfig.LTE.EPC.PLMNList.%d.PLMNID' % i, True, TrParameterType.STRING, False)
+            PLMN_PATH + 'PLMNID', True, TrParameterType.STRING, False)
+
+    # Intern the paths and freeze the table now that it is fully populated
+    PARAMETERS = MappingProxyType({
+        name: param._replace(path=sys.intern(param.path))
+        for name, param in PARAMETERS.items()
+    })
+
+    # PARAMETERS is fixed once the class body has run, so the filtered list
+    # of non-numbered parameter names only needs to be computed once
+    _PARAMETER_NAMES = tuple(
+        name for name in PARAMETERS
+        if not name.startswith('PLMN') and name not in _EXCLUDED_PARAM_NAMES
+    )
+    _NUMBERED_PARAM_NAMES = {
+        ParameterName.PLMN_N % i: [
+            ParameterName.PLMN_N_CELL_RESERVED % i,
+            ParameterName.PLMN_N_ENABLE % i,
+            ParameterName.PLMN_N_PRIMARY % i,
+            ParameterName.PLMN_N_PLMNID % i,
+        ]
+        for i in range(1, NUM_PLMNS_IN_CONFIG + 1)
+    }
 
     TRANSFORMS_FOR_ENB = {
         ParameterName.DL_BANDWIDTH: transform_for_enb.bandwidth,
@@ -282,29 +318,23 @@ class CaviumTrDataModel(DataModel):
 
     @classmethod
     def get_parameter_names(cls) -> List[ParameterName]:
-        excluded_params = [str(ParameterName.DEVICE),
-                           str(ParameterName.FAP_SERVICE)]
-        names = list(filter(lambda x: (not str(x).startswith('PLMN'))
-                                      and (str(x) not in excluded_params),
-                            cls.PARAMETERS.keys()))
-        return names
+        # Callers may mutate the returned list, so hand out a copy
+        return list(cls._PARAMETER_NAMES)
 
     @classmethod
     def get_numbered_param_names(
         cls,
     ) -> Dict[ParameterName, List[ParameterName]]:
-        names = {}
-        for i in range(1, cls.NUM_PLMNS_IN_CONFIG + 1):
-            params = []
-            params.append(ParameterName.PLMN_N_CELL_RESERVED % i)
-            params.append(ParameterName.PLMN_N_ENABLE % i)
-            params.append(ParameterName.PLMN_N_PRIMARY % i)
-            params.append(ParameterName.PLMN_N_PLMNID % i)
-            names[ParameterName.PLMN_N % i] = params
-        return names
+        # Shared table, callers must treat it as read-only
+        return cls._NUMBERED_PARAM_NAMES
 
 
 class CaviumTrConfigurationInitializer(EnodebConfigurationPostProcessor):
     def postprocess(self, desired_cfg: EnodebConfiguration) -> None:
         desired_cfg.set_parameter(ParameterName.CELL_BARRED, True)
         desired_cfg.set_parameter(ParameterName.ADMIN_STATE, True)
+
+
+# The postprocessor holds no state, so a single instance is shared by all
+# Cavium handlers
+_CONFIG_POSTPROCESSOR = CaviumTrConfigurationInitializer()
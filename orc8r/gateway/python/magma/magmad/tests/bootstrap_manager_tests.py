@@ -9,9 +9,11 @@ of patent rights can be found in the PATENTS file in the same directory.
 
 import asyncio
 import datetime
+import functools
 from concurrent import futures
+from contextlib import ExitStack
 from unittest import TestCase
-from unittest.mock import ANY, MagicMock, call, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import grpc
 import magma.magmad.bootstrap_manager as bm
@@ -30,15 +32,27 @@ from orc8r.protos.certifier_pb2 import CSR, Certificate
 # Allow access to protected variables for unit testing
 # pylint: disable=protected-access
 
-BM = 'magma.magmad.bootstrap_manager'
+_BACKEND = default_backend()
+_CURVE_P384 = ec.SECP384R1()
+# For tests that need a gateway or challenge key but don't care which
+_EC_KEY = ec.generate_private_key(_CURVE_P384, _BACKEND)
+# Never mutated, so safe to share between the dummy server and the tests
+_SIMPLE_CHALLENGE = Challenge(
+    challenge=b'simple_challenge',
+    key_type=ChallengeKey.ECHO
+)
 
 
 # https://stackoverflow.com/questions/32480108/mocking-async-call-in-python-3-5
 def AsyncMock():
     coro = MagicMock(name="CoroutineResult")
+
+    async def coro_side_effect(*args, **kwargs):
+        return coro(*args, **kwargs)
+
     corofunc = MagicMock(
         name="CoroutineFunction",
-        side_effect=asyncio.coroutine(coro),
+        side_effect=coro_side_effect,
     )
     corofunc.coro = coro
     return corofunc
@@ -48,35 +62,111 @@ class DummpyBootstrapperServer(bootstrapper_pb2_grpc.BootstrapperServicer):
     def __init__(self):
         pass
 
-    def add_to_server(self, server):
-        bootstrapper_pb2_grpc.add_BootstrapperServicer_to_server(self, server)
-
     def GetChallenge(self, request, context):
-        challenge = Challenge(
-            challenge=b'simple_challenge',
-            key_type=ChallengeKey.ECHO
-        )
-        return challenge
+        return _SIMPLE_CHALLENGE
 
     def RequestSign(self, request, context):
         return create_cert_message()
 
 
+class FakeRpcError(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+    def details(self):
+        return 'fake rpc error'
+
+
+def done_future(result=None, exception=None):
+    """
+    Returns a completed future, in place of the ones returned by grpc stubs
+    """
+    future = futures.Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+class FakeChannel:
+    """
+    In-process stand-in for a grpc channel, which dispatches unary calls
+    made through a generated stub directly to the servicer
+    """
+    def __init__(self, servicer):
+        self._servicer = servicer
+
+    # pylint: disable=unused-argument
+    def unary_unary(self, method, *args, **kwargs):
+        handler = getattr(self._servicer, method.rsplit('/', 1)[-1])
+        return FakeUnaryUnaryMultiCallable(handler)
+
+
+class FakeUnaryUnaryMultiCallable:
+    def __init__(self, handler):
+        self._handler = handler
+
+    # pylint: disable=unused-argument
+    def future(self, request, *args, **kwargs):
+        try:
+            return done_future(self._handler(request, None))
+        except Exception as e:  # pylint: disable=broad-except
+            return done_future(exception=e)
+
+
 class BootstrapManagerTest(TestCase):
-    @patch('magma.common.cert_utils.write_key')
-    @patch('%s.BootstrapManager._bootstrap_check' % BM)
-    @patch('%s.snowflake.snowflake' % BM)
-    @patch('%s.load_service_config' % BM)
+    # For on_checkin_fail tests
+    PROXY_CONFIG = {
+        'cloud_address': 'host',
+        'cloud_port': 'port',
+        'gateway_cert': 'cert',
+        'gateway_key': 'key',
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        # The dummy bootstrapper is stateless, so a single in-process channel
+        # to it is shared across all the tests
+        cls._servicer = DummpyBootstrapperServer()
+        cls.channel = FakeChannel(cls._servicer)
+        # Tests that run the event loop all drive it to completion, so one
+        # loop can be shared as well
+        cls._loop = asyncio.new_event_loop()
+
+        # Patches used by most tests are applied once and reset in setUp.
+        # Stubbing out the writes also keeps every test off the filesystem.
+        cls._patches = ExitStack()
+        cls.write_key_mock = cls._patches.enter_context(
+            patch.object(bm.cert_utils, 'write_key'))
+        cls.write_cert_mock = cls._patches.enter_context(
+            patch.object(bm.cert_utils, 'write_cert'))
+        cls.bootstrap_channel_mock = cls._patches.enter_context(
+            patch.object(bm.ServiceRegistry, 'get_bootstrap_rpc_channel'))
+        cls.bootstrap_success_cb = MagicMock()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._patches.close()
+        cls._loop.close()
+
+    @patch.object(bm.snowflake, 'snowflake')
+    @patch.object(bm, 'load_service_config')
     # Pylint doesn't handle decorators correctly
     # pylint: disable=arguments-differ, unused-argument
     def setUp(self,
               load_service_config_mock,
-              snowflake_mock,
-              bootstrap_check_mock,
-              write_key_mock):
+              snowflake_mock):
+        self.write_key_mock.reset_mock()
+        self.write_cert_mock.reset_mock()
+        self.bootstrap_channel_mock.reset_mock()
+        self.bootstrap_channel_mock.side_effect = None
+        self.bootstrap_channel_mock.return_value = self.channel
+        self.bootstrap_success_cb.reset_mock()
 
         self.gateway_key_file = '__test_gw.key'
         self.gateway_cert_file = '__test_hw_cert'
+        self.challenge_key_file = '__test_challenge.key'
         self.hw_id = 'hwid_test'
 
         load_service_config_mock.return_value = {
@@ -86,49 +176,28 @@ class BootstrapManagerTest(TestCase):
         snowflake_mock.return_value = self.hw_id
 
         service = MagicMock()
-        asyncio.set_event_loop(None)
-        service.loop = asyncio.new_event_loop()
+        service.loop = self._loop
         service.config = {
             'bootstrap_config': {
-                'challenge_key': '__test_challenge.key',
+                'challenge_key': self.challenge_key_file,
             },
         }
 
-        bootstrap_success_cb = MagicMock()
-
-        self.manager = bm.BootstrapManager(service, bootstrap_success_cb)
-        self.manager._bootstrap_success_cb = bootstrap_success_cb
-        self.manager.start_bootstrap_manager()
-        write_key_mock.assert_has_calls(
-            [call(ANY, service.config['bootstrap_config']['challenge_key'])])
-
-        # Bind the rpc server to a free port
-        self._rpc_server = grpc.server(
-            futures.ThreadPoolExecutor(max_workers=10)
-        )
-        port = self._rpc_server.add_insecure_port('0.0.0.0:0')
-        # Add the servicer
-        self._servicer = DummpyBootstrapperServer()
-        self._servicer.add_to_server(self._rpc_server)
-        self._rpc_server.start()
-        # Create a rpc stub
-        self.channel = grpc.insecure_channel('0.0.0.0:{}'.format(port))
+        self.manager = bm.BootstrapManager(service, self.bootstrap_success_cb)
 
         self.manager.SHORT_BOOTSTRAP_RETRY_INTERVAL = datetime.timedelta(
                 seconds=0)
         self.manager.LONG_BOOTSTRAP_RETRY_INTERVAL = datetime.timedelta(
                 seconds=0)
 
-        # For on_checkin_fail tests
-        self.host = 'host'
-        self.port = 'port'
-        self.cert = 'cert'
-        self.key = 'key'
-
-    def tearDown(self):
-        self._rpc_server.stop(None)
+    @patch.object(bm.BootstrapManager, '_bootstrap_check')
+    def test_start_bootstrap_manager(self, bootstrap_check_mock):
+        self.manager.start_bootstrap_manager()
+        bootstrap_check_mock.assert_called_once_with()
+        self.write_key_mock.assert_called_once_with(
+            ANY, self.challenge_key_file)
 
-    @patch('%s.BootstrapManager._bootstrap_now' % BM)
+    @patch.object(bm.BootstrapManager, '_bootstrap_now')
     def test_bootstrap(self, _bootstrap_now_mock):
         # boostrapping, no interruption
         self.manager._state = bm.BootstrapState.BOOTSTRAPPING
@@ -138,182 +207,158 @@ class BootstrapManagerTest(TestCase):
         self.manager._state = bm.BootstrapState.SCHEDULED
         self.manager._scheduled_event = MagicMock()
         self.manager.bootstrap()
-        _bootstrap_now_mock.assert_has_calls([call()])
-        self.manager._scheduled_event.cancel.assert_has_calls([call()])
+        _bootstrap_now_mock.assert_called_once_with()
+        self.manager._scheduled_event.cancel.assert_called_once_with()
 
-    @patch('magma.common.cert_utils.load_cert')
-    @patch('%s.BootstrapManager._bootstrap_now' % BM)
-    @patch('%s.BootstrapManager._schedule_periodic_bootstrap_check' % BM)
+    @patch.object(bm.cert_utils, 'load_cert')
+    @patch.object(bm.BootstrapManager, '_bootstrap_now')
+    @patch.object(bm.BootstrapManager, '_schedule_periodic_bootstrap_check')
     def test__bootstrap_check(self,
                               schedule_bootstrap_check_mock,
                               bootstrap_now_mock,
                               load_cert_mock):
+        now = datetime.datetime.utcnow()
+
         # cannot load cert
         load_cert_mock.side_effect = IOError
         self.manager._bootstrap_check()
-        load_cert_mock.assert_has_calls([call(self.gateway_cert_file)])
-        bootstrap_now_mock.assert_has_calls([call()])
+        load_cert_mock.assert_called_once_with(self.gateway_cert_file)
+        bootstrap_now_mock.assert_called_once_with()
 
         # invalid not_before
         load_cert_mock.reset_mock()
         load_cert_mock.side_effect = None # clear IOError side effect
-        not_before = datetime.datetime.utcnow() + datetime.timedelta(days=3)
+        not_before = now + datetime.timedelta(days=3)
         not_after = not_before + datetime.timedelta(days=3)
         load_cert_mock.return_value = create_cert(not_before, not_after)
         self.manager._bootstrap_check()
-        bootstrap_now_mock.assert_has_calls([call()])
+        bootstrap_now_mock.assert_called_with()
 
         # invalid not_after
         load_cert_mock.reset_mock()
-        not_before = datetime.datetime.utcnow()
-        not_after = not_before + datetime.timedelta(hours=1)
-        load_cert_mock.return_value = create_cert(not_before, not_after)
+        not_after = now + datetime.timedelta(hours=1)
+        load_cert_mock.return_value = create_cert(now, not_after)
         self.manager._bootstrap_check()
-        bootstrap_now_mock.assert_has_calls([call()])
+        bootstrap_now_mock.assert_called_with()
 
         # cert is present and valid,
         load_cert_mock.reset_mock()
-        not_before = datetime.datetime.utcnow()
-        not_after = not_before + datetime.timedelta(days=10)
-        load_cert_mock.return_value = create_cert(not_before, not_after)
+        not_after = now + datetime.timedelta(days=10)
+        load_cert_mock.return_value = create_cert(now, not_after)
         self.manager._bootstrap_check()
-        schedule_bootstrap_check_mock.assert_has_calls([call()])
-
-    @patch('%s.BootstrapManager._schedule_periodic_bootstrap_check' % BM)
-    @patch('%s.ServiceRegistry.get_bootstrap_rpc_channel' % BM)
-    @patch('%s.cert_utils.write_cert' % BM)
-    @patch('magma.common.cert_utils.write_key')
-    def test__bootstrap_now(self,
-                            write_key_mock,
-                            write_cert_mock,
-                            bootstrap_channel_mock,
-                            schedule_mock):
+        schedule_bootstrap_check_mock.assert_called_once_with()
+
+    @patch.object(bm.BootstrapManager, '_schedule_periodic_bootstrap_check')
+    def test__bootstrap_now(self, schedule_mock):
 
         def fake_schedule():
             self.manager._loop.stop()
 
-        bootstrap_channel_mock.return_value = self.channel
         schedule_mock.side_effect = fake_schedule
 
         self.manager._bootstrap_now()
         self.manager._loop.run_forever()
-        write_key_mock.assert_has_calls(
-            [call(ANY, self.manager._gateway_key_file)])
-        write_cert_mock.assert_has_calls(
-            [call(ANY, self.manager._gateway_cert_file)])
+        self.write_key_mock.assert_called_once_with(
+            ANY, self.manager._gateway_key_file)
+        self.write_cert_mock.assert_called_once_with(
+            ANY, self.manager._gateway_cert_file)
         self.assertIs(self.manager._state, bm.BootstrapState.BOOTSTRAPPING)
-        self.manager._bootstrap_success_cb.assert_has_calls([call(True)])
+        self.manager._bootstrap_success_cb.assert_called_once_with(True)
 
-    @patch('%s.BootstrapManager._retry_bootstrap' % BM)
-    @patch('%s.ServiceRegistry.get_bootstrap_rpc_channel' % BM)
-    def test__bootstrap_fail(self,
-                             bootstrap_channel_mock,
-                             retry_bootstrap_mock):
+    @patch.object(bm.BootstrapManager, '_retry_bootstrap')
+    def test__bootstrap_fail(self, retry_bootstrap_mock):
         # test fail to get channel
-        bootstrap_channel_mock.side_effect = ValueError
+        self.bootstrap_channel_mock.side_effect = ValueError
         self.manager._bootstrap_now()
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=False)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=False)
         # because retry is mocked, state should still be bootstrapping
         self.assertIs(self.manager._state, bm.BootstrapState.BOOTSTRAPPING)
 
-    @patch('%s.ec.generate_private_key' % BM)
-    @patch('%s.BootstrapManager._retry_bootstrap' % BM)
+    @patch.object(bm.ec, 'generate_private_key')
+    @patch.object(bm.BootstrapManager, '_retry_bootstrap')
     def test__get_challenge_done_pk_exception(self, retry_bootstrap_mock, generate_pk_mock):
-        future = MagicMock()
-        future.exception = lambda: None
+        future = done_future()
         # Private key generation returns error
         generate_pk_mock.side_effect = InternalError("", 0)
         self.manager._get_challenge_done(future)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=True)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=True)
 
-    @patch('%s.BootstrapManager._retry_bootstrap' % BM)
-    @patch('%s.BootstrapManager._request_sign' % BM)
+    @patch.object(bm.BootstrapManager, '_retry_bootstrap')
+    @patch.object(bm.BootstrapManager, '_request_sign')
     def test__get_challenge_done(self, request_sign_mock, retry_bootstrap_mock):
-        future = MagicMock()
-
         # GetChallenge returns error
+        future = done_future(exception=FakeRpcError())
         self.manager._get_challenge_done(future)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=False)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=False)
 
         # Fail to construct response
         retry_bootstrap_mock.reset_mock()
-        future.exception = lambda: None
+        future = done_future(
+            Challenge(key_type=5, challenge=b'crap challenge'))
         self.manager._get_challenge_done(future)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=True)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=True)
 
         # No error
         retry_bootstrap_mock.reset_mock()
         self.manager._loop = MagicMock()
-        future.result = lambda: Challenge(
-            challenge=b'simple_challenge',
-            key_type=ChallengeKey.ECHO
-        )
+        future = done_future(_SIMPLE_CHALLENGE)
         self.manager._get_challenge_done(future)
         retry_bootstrap_mock.assert_not_called()
-        request_sign_mock.assert_has_calls([call(ANY)])
-
-    @patch('%s.BootstrapManager._retry_bootstrap' % BM)
-    @patch('%s.ServiceRegistry.get_bootstrap_rpc_channel' % BM)
-    def test__request_sign(self, bootstrap_channel_mock, retry_bootstrap_mock):
-        challenge = Challenge(
-            challenge=b'simple_challenge',
-            key_type=ChallengeKey.ECHO
-        )
-        self.manager._gateway_key = ec.generate_private_key(
-            ec.SECP384R1(), default_backend())
+        request_sign_mock.assert_called_once_with(ANY)
+
+    @patch.object(bm.BootstrapManager, '_retry_bootstrap')
+    def test__request_sign(self, retry_bootstrap_mock):
+        self.manager._gateway_key = _EC_KEY
         csr = self.manager._create_csr()
-        response = self.manager._construct_response(challenge, csr)
+        response = self.manager._construct_response(_SIMPLE_CHALLENGE, csr)
 
         # test fail to get channel
-        bootstrap_channel_mock.side_effect = ValueError
+        self.bootstrap_channel_mock.side_effect = ValueError
         self.manager._request_sign(response)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=False)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=False)
 
         # test no error
         retry_bootstrap_mock.reset_mock()
-        bootstrap_channel_mock.reset_mock()
-        bootstrap_channel_mock.side_effect = None
-        bootstrap_channel_mock.return_value = self.channel
+        self.bootstrap_channel_mock.reset_mock()
+        self.bootstrap_channel_mock.side_effect = None
+        # Don't leave the done callback pending on the shared loop
+        self.manager._loop = MagicMock()
         self.manager._request_sign(response)
         retry_bootstrap_mock.assert_not_called()
+        self.manager._loop.call_soon_threadsafe.assert_called_once_with(
+            self.manager._request_sign_done, ANY)
 
-    @patch('%s.cert_utils.write_cert' % BM)
-    @patch('%s.cert_utils.write_key' % BM)
-    @patch('%s.BootstrapManager._schedule_periodic_bootstrap_check' % BM)
-    @patch('%s.BootstrapManager._retry_bootstrap' % BM)
+    @patch.object(bm.BootstrapManager, '_schedule_periodic_bootstrap_check')
+    @patch.object(bm.BootstrapManager, '_retry_bootstrap')
     def test__request_sign_done(self,
                                 retry_bootstrap_mock,
-                                schedule_bootstrap_check_mock,
-                                write_key_mock,
-                                write_cert_mock):
-        future = MagicMock()
-
+                                schedule_bootstrap_check_mock):
         # RequestSign returns error
+        future = done_future(exception=FakeRpcError())
         self.manager._request_sign_done(future)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=False)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=False)
 
         # certificate is invalid
         retry_bootstrap_mock.reset_mock()
-        future.exception = lambda: None
         not_before = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
         invalid_cert = create_cert_message(not_before=not_before)
-        future.result = lambda: invalid_cert
+        future = done_future(invalid_cert)
         self.manager._request_sign_done(future)
-        retry_bootstrap_mock.assert_has_calls([call(hard_failure=True)])
+        retry_bootstrap_mock.assert_called_once_with(hard_failure=True)
 
         # certificate is valid
         retry_bootstrap_mock.reset_mock()
         valid_cert = create_cert_message()
-        future.result = lambda: valid_cert
+        future = done_future(valid_cert)
         self.manager._request_sign_done(future)
-        self.manager._bootstrap_success_cb.assert_has_calls([call(True)])
+        self.manager._bootstrap_success_cb.assert_called_once_with(True)
         retry_bootstrap_mock.assert_not_called()
-        write_key_mock.assert_has_calls(
-            [call(ANY, self.manager._gateway_key_file)])
-        write_cert_mock.assert_has_calls(
-            [call(ANY, self.manager._gateway_cert_file)])
+        self.write_key_mock.assert_called_once_with(
+            ANY, self.manager._gateway_key_file)
+        self.write_cert_mock.assert_called_once_with(
+            ANY, self.manager._gateway_cert_file)
 
-        schedule_bootstrap_check_mock.assert_has_calls([call()])
+        schedule_bootstrap_check_mock.assert_called_once_with()
 
     def test__retry_bootstrap(self):
         self.manager._loop = MagicMock()
@@ -324,38 +369,35 @@ class BootstrapManagerTest(TestCase):
         self.manager._state = bm.BootstrapState.BOOTSTRAPPING
 
         self.manager._retry_bootstrap(False)
-        self.manager._loop.call_later.assert_has_calls(
-            [call(0, self.manager._bootstrap_now)])
+        self.manager._loop.call_later.assert_called_once_with(
+            0, self.manager._bootstrap_now)
         self.assertIs(self.manager._state, bm.BootstrapState.SCHEDULED)
 
         self.manager._state = bm.BootstrapState.BOOTSTRAPPING
         self.manager._retry_bootstrap(True)
-        self.manager._loop.call_later.assert_has_calls(
-            [call(1, self.manager._bootstrap_now)])
+        self.manager._loop.call_later.assert_called_with(
+            1, self.manager._bootstrap_now)
         self.assertIs(self.manager._state, bm.BootstrapState.SCHEDULED)
 
     def test__schedule_periodic_bootstrap_check(self):
         self.manager._loop = MagicMock()
         self.manager._state = bm.BootstrapState.BOOTSTRAPPING
         self.manager._schedule_periodic_bootstrap_check()
-        self.manager._loop.call_later.assert_has_calls(
-            [call(self.manager.PERIODIC_BOOTSTRAP_CHECK_INTERVAL.total_seconds(),
-                  self.manager._bootstrap_check)])
+        self.manager._loop.call_later.assert_called_once_with(
+            self.manager.PERIODIC_BOOTSTRAP_CHECK_INTERVAL.total_seconds(),
+            self.manager._bootstrap_check)
         self.assertIs(self.manager._state, bm.BootstrapState.SCHEDULED)
 
     def test__create_csr(self):
-        self.manager._gateway_key = ec.generate_private_key(
-            ec.SECP384R1(), default_backend())
+        self.manager._gateway_key = _EC_KEY
         csr_msg = self.manager._create_csr()
         self.assertEqual(csr_msg.id.gateway.hardware_id, self.hw_id)
 
-    @patch('magma.common.cert_utils.load_key')
+    @patch.object(bm.cert_utils, 'load_key')
     def test__construct_response(self, load_key_mock):
-        ecdsa_key = ec.generate_private_key(ec.SECP384R1(), default_backend())
-
         key_types = {
             ChallengeKey.ECHO: None,
-            ChallengeKey.SOFTWARE_ECDSA_SHA256: ecdsa_key,
+            ChallengeKey.SOFTWARE_ECDSA_SHA256: _EC_KEY,
         }
         for key_type, key in key_types.items():
             load_key_mock.return_value = key
@@ -370,12 +412,12 @@ class BootstrapManagerTest(TestCase):
                 msg='Unknown key type: %s' % challenge.key_type):
             self.manager._construct_response(challenge, CSR())
 
-    @patch('magma.common.cert_utils.load_key')
+    @patch.object(bm.cert_utils, 'load_key')
     def test__ecdsa_sha256_response(self, load_key_mock):
         challenge = b'challenge'
 
         # success case
-        private_key = ec.generate_private_key(ec.SECP384R1(), default_backend())
+        private_key = ec.generate_private_key(_CURVE_P384, _BACKEND)
         load_key_mock.return_value = private_key
         r, s = self.manager._ecdsa_sha256_response(challenge)
         r = int.from_bytes(r, 'big')
@@ -393,23 +435,24 @@ class BootstrapManagerTest(TestCase):
         # wrong type of key, e.g. rsa
         load_key_mock.reset_mock()
         load_key_mock.return_value = rsa.generate_private_key(
-            65537, 2048, default_backend())
+            65537, 2048, _BACKEND)
         with self.assertRaises(
                 bm.BootstrapError,
                 msg='Challenge key cannot be used for ECDSA signature'):
             self.manager._ecdsa_sha256_response(challenge)
 
     def test__is_valid_certificate(self):
+        now = datetime.datetime.utcnow()
+
         # not-yet-valid
-        not_before = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        not_before = now + datetime.timedelta(hours=1)
         cert = create_cert_message(not_before=not_before)
         is_valid = self.manager._is_valid_certificate(cert)
         self.assertFalse(is_valid)
 
         # expiring soon
-        not_before = datetime.datetime.utcnow()
-        not_after = not_before + datetime.timedelta(hours=1)
-        cert = create_cert_message(not_before=not_before, not_after=not_after)
+        not_after = now + datetime.timedelta(hours=1)
+        cert = create_cert_message(not_before=now, not_after=not_after)
         is_valid = self.manager._is_valid_certificate(cert)
         self.assertFalse(is_valid)
 
@@ -418,54 +461,55 @@ class BootstrapManagerTest(TestCase):
         is_valid = self.manager._is_valid_certificate(cert)
         self.assertTrue(is_valid)
 
-    @patch('%s.ServiceRegistry.get_proxy_config' % BM)
-    @patch('%s.cert_is_invalid' % BM, new_callable=AsyncMock)
+    def _run_on_checkin_fail(self, mock_get_proxy_config):
+        """
+        Runs on_checkin_fail for a non-permission error, and returns the mock
+        standing in for _bootstrap_now
+        """
+        mock_get_proxy_config.return_value = self.PROXY_CONFIG
+        self.manager._bootstrap_now = MagicMock(name='_bootstrap_now')
+
+        future = self.manager.on_checkin_fail(grpc.StatusCode.UNKNOWN)
+        self.manager._loop.run_until_complete(future)
+        return self.manager._bootstrap_now
+
+    @patch.object(bm.ServiceRegistry, 'get_proxy_config')
+    @patch.object(bm, 'cert_is_invalid', new_callable=AsyncMock)
     def test__on_checkin_fail(
         self,
         mock_cert_is_invalid,
         mock_get_proxy_config,
     ):
-        mock_get_proxy_config.return_value = {
-            'cloud_address': self.host,
-            'cloud_port': self.port,
-            'gateway_cert': self.cert,
-            'gateway_key': self.key,
-        }
-        self.manager._bootstrap_now = MagicMock(name='_bootstrap_now')
-
-        future = self.manager.on_checkin_fail(grpc.StatusCode.UNKNOWN)
-        self.manager._loop.run_until_complete(future)
+        bootstrap_now_mock = self._run_on_checkin_fail(mock_get_proxy_config)
 
         mock_cert_is_invalid.assert_called_once_with(
-            self.host, self.port, self.cert, self.key, self.manager._loop
+            'host', 'port', 'cert', 'key', self.manager._loop
         )
-        self.assertEqual(self.manager._bootstrap_now.call_count, 1)
+        self.assertEqual(bootstrap_now_mock.call_count, 1)
 
-    @patch('%s.ServiceRegistry.get_proxy_config' % BM)
-    @patch('%s.cert_is_invalid' % BM, new_callable=AsyncMock)
+    @patch.object(bm.ServiceRegistry, 'get_proxy_config')
+    @patch.object(bm, 'cert_is_invalid', new_callable=AsyncMock)
     def test__on_checkin_fail_cert_valid(
         self,
         mock_cert_is_invalid,
         mock_get_proxy_config,
     ):
-        mock_get_proxy_config.return_value = {
-            'cloud_address': self.host,
-            'cloud_port': self.port,
-            'gateway_cert': self.cert,
-            'gateway_key': self.key,
-        }
         mock_cert_is_invalid.coro.return_value = False
 
-        self.manager._bootstrap_now = MagicMock(name='_bootstrap_now')
+        bootstrap_now_mock = self._run_on_checkin_fail(mock_get_proxy_config)
 
-        future = self.manager.on_checkin_fail(grpc.StatusCode.UNKNOWN)
-        self.manager._loop.run_until_complete(future)
+        self.assertEqual(bootstrap_now_mock.call_count, 0)
 
-        self.assertEqual(self.manager._bootstrap_now.call_count, 0)
+
+@functools.lru_cache(maxsize=None)
+def _cert_key():
+    # Tests only look at the validity window of the certs, so every test
+    # cert is signed with the same EC key, which is much cheaper than RSA
+    return ec.generate_private_key(ec.SECP256R1(), _BACKEND)
 
 
 def create_cert(not_before, not_after):
-    key = rsa.generate_private_key(65537, 2048, default_backend())
+    key = _cert_key()
 
     subject = issuer = x509.Name([
         x509.NameAttribute(x509.oid.NameOID.COUNTRY_NAME, u"US"),
@@ -487,17 +531,33 @@ def create_cert(not_before, not_after):
         not_before
     ).not_valid_after(
         not_after
-    ).sign(key, hashes.SHA256(), default_backend())
+    ).sign(key, hashes.SHA256(), _BACKEND)
 
     return cert
 
 
 def create_cert_message(not_before=None, not_after=None):
+    if not_before is None and not_after is None:
+        return _default_cert_message()
     if not_before is None:
         not_before = datetime.datetime.utcnow()
     if not_after is None:
         not_after = not_before + datetime.timedelta(days=10)
 
+    # Signing is the expensive part, so share certs between calls that ask
+    # for the same validity window, to the second
+    return _signed_cert_message(not_before.replace(microsecond=0),
+                                not_after.replace(microsecond=0))
+
+
+@functools.lru_cache(maxsize=None)
+def _default_cert_message():
+    # Valid for the next 10 days, which outlasts any test run
+    return create_cert_message(not_before=datetime.datetime.utcnow())
+
+
+@functools.lru_cache(maxsize=None)
+def _signed_cert_message(not_before, not_after):
     cert = create_cert(not_before, not_after)
 
     not_before_stamp = Timestamp()